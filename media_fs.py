@@ -0,0 +1,32 @@
+"""
+Small filesystem helpers shared by organize_media_by_month.py and
+migrate_media_to_SSD.py. Keep this file in the same folder as the scripts.
+"""
+import os
+from typing import Iterator
+
+
+def iter_files(root) -> Iterator[os.DirEntry]:
+    """
+    Yield a DirEntry for every file under root (recursively).
+
+    Uses os.scandir, which gets the file type from the directory listing
+    itself, so we don't need an extra stat() per entry like Path.rglob +
+    is_file() does.
+
+    Behaves like Path.rglob("*") + is_file(): symlinks to files are included,
+    symlinked folders are not descended into, and folders we can't read are
+    skipped.
+    """
+    stack = [os.fspath(root)]
+    while stack:
+        try:
+            it = os.scandir(stack.pop())
+        except (PermissionError, NotADirectoryError):
+            continue
+        with it:
+            for entry in it:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                elif entry.is_file():
+                    yield entry
@@ -1,21 +1,31 @@
 import os
 import shutil
+import struct
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 from datetime import datetime
+from typing import Optional
 
 from PIL import Image, ExifTags
 
+from media_fs import iter_files
+
 # Map EXIF tag names to their numeric ids once
 EXIF_TAGS = {v: k for k, v in ExifTags.TAGS.items()}
+DTO_TAG_ID = EXIF_TAGS["DateTimeOriginal"]
+EXIF_IFD_TAG_ID = EXIF_TAGS["ExifOffset"]
 
 # File types we treat as "images" we try to read EXIF from
-IMAGE_EXTS = {".jpg", ".jpeg", ".jpe", ".tif", ".tiff", ".heic", ".png"}
+IMAGE_EXTS = frozenset({".jpg", ".jpeg", ".jpe", ".tif", ".tiff", ".heic", ".png"})
+
+# JPEGs get their EXIF read by our own small scanner (see _read_exif_fast)
+JPEG_EXTS = frozenset({".jpg", ".jpeg", ".jpe"})
 
 # RAW photo formats (will be placed in a separate "raw" folder)
-RAW_EXTS = {".raf", ".cr2", ".nef", ".dng", ".arw", ".rw2", ".orf"}
+RAW_EXTS = frozenset({".raf", ".cr2", ".nef", ".dng", ".arw", ".rw2", ".orf"})
 
 # Video formats (will be placed in a separate "video" folder)
-VIDEO_EXTS = {".mp4", ".mov", ".m4v", ".avi", ".mts", ".m2ts"}
+VIDEO_EXTS = frozenset({".mp4", ".mov", ".m4v", ".avi", ".mts", ".m2ts"})
 
 # All media we want to move (you can add more extensions here)
 MEDIA_EXTS = IMAGE_EXTS.union(RAW_EXTS).union(VIDEO_EXTS)
@@ -23,46 +33,218 @@ MEDIA_EXTS = IMAGE_EXTS.union(RAW_EXTS).union(VIDEO_EXTS)
 # Special folders at the root of the library
 INBOX_DIR_NAME = "_inbox"            # drop new media here to be auto-organized
 
+# The EXIF block (APP1) sits right after the JPEG header and is at most 64 KB
+EXIF_SCAN_BYTES = 64 * 1024
+
+# Below this many inbox files, reading dates inline beats starting worker
+# processes (on macOS each worker re-imports Pillow).
+PROCESS_POOL_MIN_FILES = 64
+
+def _parse_exif_datetime(raw: str) -> Optional[datetime]:
+    """Parse an EXIF date like '2025:01:15 14:23:11', or return None."""
+    # EXIF dates are normally fixed-width YYYY:MM:DD HH:MM:SS, so slice them
+    # directly (a lot cheaper than strptime).
+    if len(raw) == 19 and raw[4] == ":" and raw[7] == ":" and raw[10] == " ":
+        try:
+            return datetime(int(raw[0:4]), int(raw[5:7]), int(raw[8:10]),
+                            int(raw[11:13]), int(raw[14:16]), int(raw[17:19]))
+        except ValueError:
+            pass
+    # Some cameras and editors write fields without zero padding
+    # (e.g. '2025:1:15 14:23:11'); strptime accepts those.
+    try:
+        return datetime.strptime(raw, "%Y:%m:%d %H:%M:%S")
+    except (TypeError, ValueError):
+        return None
+
+
+def _read_exif_fast(buf: bytes) -> Optional[datetime]:
+    """
+    Read DateTimeOriginal from the start of a JPEG without Pillow.
+
+    `buf` is the first 64 KB of the file. We find the APP1 "Exif" segment and
+    look up the one tag we need, instead of parsing every IFD (thumbnails,
+    maker notes, ...). Returns None if the file has no EXIF date.
+
+    Raises ValueError / struct.error if the file doesn't look like a JPEG we
+    understand, so the caller can fall back to Pillow.
+    """
+    if buf[:2] != b"\xff\xd8":
+        raise ValueError("not a JPEG")
+
+    # Walk the JPEG segments until we find APP1 with an Exif header
+    pos = 2
+    while True:
+        marker, length = struct.unpack_from(">HH", buf, pos)
+        if marker in (0xFFDA, 0xFFD9):  # start of image data / end of image
+            return None
+        if marker >> 8 != 0xFF:
+            raise ValueError("bad JPEG marker")
+        segment = buf[pos + 4:pos + 2 + length]
+        if len(segment) != length - 2:
+            raise ValueError("JPEG header is longer than we read")
+        if marker == 0xFFE1 and segment[:6] == b"Exif\x00\x00":
+            tiff = segment[6:]
+            break
+        pos += 2 + length
+
+    # TIFF header: byte order, magic 42, offset of the first IFD
+    if tiff[:2] == b"II":
+        order = "<"
+    elif tiff[:2] == b"MM":
+        order = ">"
+    else:
+        raise ValueError("bad TIFF byte order")
+    magic, ifd0 = struct.unpack_from(order + "HI", tiff, 2)
+    if magic != 42:
+        raise ValueError("bad TIFF magic")
+
+    def read_ifd(offset: int) -> dict:
+        """Return {tag: (type, count, raw 4-byte value)} for one IFD."""
+        (count,) = struct.unpack_from(order + "H", tiff, offset)
+        entries = {}
+        for i in range(count):
+            tag, typ, n = struct.unpack_from(order + "HHI", tiff, offset + 2 + 12 * i)
+            entries[tag] = (typ, n, tiff[offset + 10 + 12 * i:offset + 14 + 12 * i])
+        return entries
+
+    entries = read_ifd(ifd0)
+    if DTO_TAG_ID not in entries:
+        exif_ifd = entries.get(EXIF_IFD_TAG_ID)
+        if exif_ifd is None:
+            return None
+        (exif_offset,) = struct.unpack(order + "I", exif_ifd[2])
+        entries = read_ifd(exif_offset)
+        if DTO_TAG_ID not in entries:
+            return None
+
+    typ, n, value = entries[DTO_TAG_ID]
+    if typ != 2:  # ASCII
+        return None
+    if n > 4:
+        (offset,) = struct.unpack(order + "I", value)
+        value = tiff[offset:offset + n]
+    raw = value[:n].split(b"\x00", 1)[0].decode("ascii", "replace").strip()
+    return _parse_exif_datetime(raw)
+
+
+def _read_exif_pillow(path_str: str) -> Optional[datetime]:
+    """Return an image's EXIF DateTimeOriginal using Pillow (or None)."""
+    try:
+        with Image.open(path_str) as img:
+            exif = img._getexif()
+            if exif and DTO_TAG_ID in exif:
+                raw = exif[DTO_TAG_ID]  # e.g. '2025:01:15 14:23:11'
+                return _parse_exif_datetime(raw)
+    except Exception:
+        pass
+    return None
+
+
 def get_capture_datetime(path: Path) -> datetime:
     """
     Try to get DateTimeOriginal from EXIF for images.
     If not available (or not an image), fall back to file's modified time.
+
+    JPEGs go through _read_exif_fast and are opened only once: the EXIF header
+    and the modified time both come from the same open file. Everything else
+    (HEIC, TIFF, PNG), and JPEGs our scanner can't make sense of, go through
+    Pillow.
     """
-    if path.suffix.lower() in IMAGE_EXTS:
+    path_str = os.fspath(path)
+    ext = os.path.splitext(path_str)[1].lower()
+    if ext in JPEG_EXTS:
         try:
-            with Image.open(path) as img:
-                exif = img._getexif()
-                if exif:
-                    dto_tag = EXIF_TAGS.get("DateTimeOriginal")
-                    if dto_tag in exif:
-                        raw = exif[dto_tag]  # e.g. '2025:01:15 14:23:11'
-                        # EXIF format: YYYY:MM:DD HH:MM:SS
-                        return datetime.strptime(raw, "%Y:%m:%d %H:%M:%S")
-        except Exception:
-            pass
+            with open(path_str, "rb") as f:
+                head = f.read(EXIF_SCAN_BYTES)
+                mtime = os.fstat(f.fileno()).st_mtime
+        except OSError:
+            pass  # can't read it; use the modified time below, like Pillow errors
+        else:
+            try:
+                dt = _read_exif_fast(head)
+            except (ValueError, struct.error):
+                dt = _read_exif_pillow(path_str)
+            return dt if dt is not None else datetime.fromtimestamp(mtime)
+    elif ext in IMAGE_EXTS:
+        dt = _read_exif_pillow(path_str)
+        if dt is not None:
+            return dt
 
     # Fallback: modification time
-    ts = path.stat().st_mtime
+    ts = os.stat(path_str).st_mtime
     return datetime.fromtimestamp(ts)
 
 
+def _classify(path_str: str) -> tuple[str, Optional[datetime]]:
+    """
+    Worker for organize(): return (path, capture datetime) for one file.
+    The datetime is None if the file can't be read at all (e.g. it was
+    removed after we listed the inbox).
+
+    Runs in a separate process, since EXIF parsing is CPU-bound Python code.
+    """
+    try:
+        return path_str, get_capture_datetime(Path(path_str))
+    except OSError as e:
+        print(f"WARNING: could not read {path_str}: {e}. Skipping.")
+        return path_str, None
+
+
 def safe_move(src: Path, dst: Path):
     """
     Move file from src to dst, avoiding overwriting.
     If dst exists, append _1, _2, etc. to filename.
-    """
-    dst.parent.mkdir(parents=True, exist_ok=True)
 
+    The destination folder must already exist (organize() creates them all
+    up front).
+    """
     base = dst.stem
     ext = dst.suffix
     candidate = dst
     counter = 1
 
-    while candidate.exists():
-        candidate = dst.with_name(f"{base}_{counter}{ext}")
-        counter += 1
+    # Claim the name by creating an empty placeholder with O_EXCL: one syscall
+    # per try, and nobody else can grab the same name between check and move.
+    while True:
+        try:
+            fd = os.open(candidate, os.O_WRONLY | os.O_CREAT | os.O_EXCL)
+        except FileExistsError:
+            candidate = dst.with_name(f"{base}_{counter}{ext}")
+            counter += 1
+            continue
+        os.close(fd)
+        break
+
+    try:
+        # Replaces the placeholder we just created
+        shutil.move(str(src), str(candidate))
+    except BaseException:
+        candidate.unlink(missing_ok=True)
+        raise
+
+
+def _target_dir(root_str: str, path_str: str, dt: datetime) -> tuple[str, str]:
+    """Return (month/day/type folder under root_str, short label) for a file."""
+    ext = os.path.splitext(path_str)[1].lower()
+    # Determine month and day folders from capture datetime
+    month_folder_name = f"{dt.year:04d}-{dt.month:02d}"
+    day_folder_name = f"{dt.year:04d}-{dt.month:02d}-{dt.day:02d}"
+
+    # Decide subfolder based on file type
+    if ext in VIDEO_EXTS:
+        target_dir = os.path.join(root_str, month_folder_name, day_folder_name, "video")
+        label = f"{day_folder_name}/video"
+    elif ext in RAW_EXTS:
+        target_dir = os.path.join(root_str, month_folder_name, day_folder_name, "raw")
+        label = f"{day_folder_name}/raw"
+    else:
+        # Regular image (JPEG/PNG/etc.)
+        target_dir = os.path.join(root_str, month_folder_name, day_folder_name, "jpeg")
+        label = f"{day_folder_name}/jpeg"
+
+    return target_dir, label
 
-    shutil.move(str(src), str(candidate))
 
 def organize(root_folder: Path):
     """
@@ -85,43 +267,62 @@ def organize(root_folder: Path):
     inbox_folder.mkdir(parents=True, exist_ok=True)
 
     # Only organize files that are currently in _inbox (or inside it)
-    for path in inbox_folder.rglob("*"):
-        if not path.is_file():
-            continue
+    found = []
+    for entry in iter_files(inbox_folder):
+        name = entry.name
 
         # Skip hidden files
-        if path.name.startswith("."):
+        if name.startswith("."):
             continue
 
-        ext = path.suffix.lower()
-        if ext not in MEDIA_EXTS:
+        # Cheap extension check straight on the name (no Path objects)
+        dot = name.rfind(".")
+        if dot < 0 or name[dot:].lower() not in MEDIA_EXTS:
             continue
 
-        # Determine month and day folders from capture datetime
-        dt = get_capture_datetime(path)
-        month_folder_name = f"{dt.year:04d}-{dt.month:02d}"
-        day_folder_name = f"{dt.year:04d}-{dt.month:02d}-{dt.day:02d}"
-
-        # Decide subfolder based on file type
-        if ext in VIDEO_EXTS:
-            target_dir = root_folder / month_folder_name / day_folder_name / "video"
-            label = f"{day_folder_name}/video"
-        elif ext in RAW_EXTS:
-            target_dir = root_folder / month_folder_name / day_folder_name / "raw"
-            label = f"{day_folder_name}/raw"
-        else:
-            # Regular image (JPEG/PNG/etc.)
-            target_dir = root_folder / month_folder_name / day_folder_name / "jpeg"
-            label = f"{day_folder_name}/jpeg"
+        found.append((entry.inode(), entry.path))
+
+    if not found:
+        return
+
+    # Handle files in inode order (roughly their order on disk) to cut down
+    # on seeking, especially on spinning drives.
+    found.sort(key=lambda item: item[0])
+    paths = [path_str for _, path_str in found]
 
-        target_path = target_dir / path.name
+    # Read capture dates on all cores; the moves themselves happen afterwards
+    # in this process so collision renaming in safe_move never races.
+    if len(paths) >= PROCESS_POOL_MIN_FILES:
+        with ProcessPoolExecutor() as executor:
+            results = list(executor.map(_classify, paths, chunksize=32))
+    else:
+        results = [_classify(path_str) for path_str in paths]
+
+    # Plain strings + os.path from here on (one pass per file); Path objects
+    # only at the safe_move boundary.
+    root_str = str(root_folder)
+    moves = []
+    for path_str, dt in results:
+        if dt is None:
+            continue
+
+        target_dir, label = _target_dir(root_str, path_str, dt)
+        folder, name = os.path.split(path_str)
 
         # If file is already in the correct folder, skip it (makes script safe to re-run)
-        if path.parent == target_dir:
+        if folder == target_dir:
             continue
 
-        print(f"Moving: {path} -> {target_path}  [{label}]")
-        safe_move(path, target_path)
+        moves.append((path_str, os.path.join(target_dir, name), label))
+
+    # A shoot usually fills only a few month/day/type folders, so collect
+    # them into a set and create them all up front, before any moves.
+    for folder in {os.path.dirname(target_path) for _, target_path, _ in moves}:
+        os.makedirs(folder, exist_ok=True)
+
+    for path_str, target_path, label in moves:
+        print(f"Moving: {path_str} -> {target_path}  [{label}]")
+        safe_move(Path(path_str), Path(target_path))
 
 
 if __name__ == "__main__":